@@ -13,7 +13,9 @@ import argparse
 import warnings
 import time
 import os
+import re
 import sys
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import pandas as pd
 
@@ -26,6 +28,46 @@ except ImportError:
     AKSHARE_AVAILABLE = False
     print("警告：未安装akshare库，将无法自动获取数据。请运行：pip install akshare")
 
+# 尝试导入scipy，其expit是单次融合的sigmoid内核
+try:
+    from scipy.special import expit
+
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+# 尝试导入bottleneck，如果失败则回退到pandas的rolling实现
+try:
+    import bottleneck as bn
+
+    BOTTLENECK_AVAILABLE = True
+except ImportError:
+    BOTTLENECK_AVAILABLE = False
+
+# 尝试导入numexpr，用于融合的逐元素表达式求值
+try:
+    import numexpr as ne
+
+    NUMEXPR_AVAILABLE = True
+except ImportError:
+    NUMEXPR_AVAILABLE = False
+
+# 尝试导入pyarrow，用于Parquet缓存
+try:
+    import pyarrow  # noqa: F401
+
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# 尝试导入numba，用于JIT编译热点循环
+try:
+    from numba import njit, prange
+
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
 warnings.filterwarnings("ignore")
 
 # 默认文件配置
@@ -56,6 +98,20 @@ def check_file_exists(file_path):
         return False
 
 
+# 数据源新鲜度TTL：12小时内更新过的文件视为最新，跳过重新下载
+FETCH_TTL_SECONDS = 12 * 3600
+
+
+def is_file_fresh(file_path, ttl_seconds=FETCH_TTL_SECONDS):
+    """检查文件是否存在且在TTL内更新过"""
+    if not check_file_exists(file_path):
+        return False
+    try:
+        return time.time() - os.path.getmtime(file_path) < ttl_seconds
+    except OSError:
+        return False
+
+
 # ========== 数据获取模块 ==========
 def get_margin_data():
     """获取融资融券历史数据"""
@@ -125,98 +181,246 @@ def get_index_data(symbol, name, file_key):
         return False
 
 
+# akshare可获取的数据源（抖音搜索指数为人工维护，不在下载范围内）
+FETCHABLE_KEYS = ("margin", "pe", "hs300", "csiall", "shanghai")
+
+
 def fetch_all_data(force_refresh=False):
     """获取所有必要的数据"""
     log_message("开始数据获取流程...")
 
-    # 检查是否需要获取数据
-    if not force_refresh:
-        existing_files = [f for f in DEFAULT_FILES.values() if check_file_exists(f)]
-        if len(existing_files) >= 4:  # 至少需要4个核心文件
-            log_message(f"发现现有数据文件: {existing_files}")
-            log_message("使用现有数据文件，如需重新获取请使用 --force-refresh 参数")
+    # 按数据源逐一判断新鲜度：TTL内的文件直接复用，只补拉过期或缺失的部分
+    if force_refresh:
+        stale_keys = set(FETCHABLE_KEYS)
+    else:
+        stale_keys = {
+            k for k in FETCHABLE_KEYS if not is_file_fresh(DEFAULT_FILES[k])
+        }
+        if not stale_keys:
+            log_message("所有数据文件均在TTL内更新过，跳过数据获取")
             return True
 
     if not AKSHARE_AVAILABLE:
+        # 无法下载时退回现有文件：数据可能过期但仍可计算
+        existing_files = [f for f in DEFAULT_FILES.values() if check_file_exists(f)]
+        if len(existing_files) >= 4:  # 至少需要4个核心文件
+            log_message(f"akshare不可用，使用现有数据文件: {existing_files}", "WARNING")
+            return True
         log_message("akshare不可用，无法获取数据", "ERROR")
         return False
 
-    success_count = 0
+    fresh_count = len(FETCHABLE_KEYS) - len(stale_keys)
+    if fresh_count:
+        log_message(f"{fresh_count} 个数据源仍然新鲜，跳过重新下载")
 
-    # 获取融资融券数据
-    if get_margin_data():
-        success_count += 1
-    time.sleep(3)
-
-    # 获取市盈率数据
-    if get_pe_data():
-        success_count += 1
-    time.sleep(3)
-
-    # 获取指数数据
+    # 指数数据配置
     index_configs = [
         ("000300", "沪深300", "hs300"),
         ("000985", "中证全指", "csiall"),
         ("000001", "上证指数", "shanghai"),  # 新增上证指数
     ]
 
+    fetch_tasks = []
+    if "margin" in stale_keys:
+        fetch_tasks.append((get_margin_data,))
+    if "pe" in stale_keys:
+        fetch_tasks.append((get_pe_data,))
     for symbol, name, key in index_configs:
-        if get_index_data(symbol, name, key):
-            success_count += 1
-        time.sleep(3)
+        if key in stale_keys:
+            fetch_tasks.append((get_index_data, symbol, name, key))
+
+    # 并发下载：接口调用为I/O密集型，线程池重叠网络等待，取代逐个sleep串行
+    success_count = fresh_count
+    with ThreadPoolExecutor(max_workers=len(fetch_tasks)) as executor:
+        futures = [executor.submit(task[0], *task[1:]) for task in fetch_tasks]
+        success_count += sum(1 for f in futures if f.result())
 
     log_message(
-        f"数据获取完成，成功获取 {success_count}/{len(index_configs) + 2} 个数据源"
+        f"数据获取完成，成功获取 {success_count}/{len(FETCHABLE_KEYS)} 个数据源"
     )
     return success_count >= 3  # 至少需要3个数据源才能继续
 
 
 # ========== 数据处理模块 ==========
-def try_read_csv(path, **kwargs):
-    """尝试多种编码读取CSV文件"""
+# CSV读取缓存：以(路径, mtime)为键，长进程内重复调用时跳过重新解析
+_READ_CSV_CACHE = {}
+
+
+_CSV_ENCODINGS = ["utf-8-sig", "utf-8", "gbk", "gb2312"]
+
+
+def detect_encoding(path):
+    """用文件头部64KB样本探测编码，避免整文件反复试读"""
+    with open(path, "rb") as f:
+        head = f.read(65536)
+    for enc in _CSV_ENCODINGS:
+        try:
+            head.decode(enc)
+            return enc
+        except UnicodeDecodeError:
+            # 采样可能截断多字节字符，去掉尾部残片再试一次
+            try:
+                head[:-4].decode(enc)
+                return enc
+            except UnicodeDecodeError:
+                continue
+    return "utf-8"
+
+
+def try_read_csv(path, dtype=None, **kwargs):
+    """探测编码后单次读取CSV文件（结果按文件mtime缓存）
+
+    dtype直接下推到解析器，由C/pyarrow引擎原地产出数值列；
+    缺失的列名会被解析器忽略，脏数据导致强转失败时回退为object解析。
+    """
     if not check_file_exists(path):
         raise FileNotFoundError(f"文件不存在: {path}")
 
-    encodings = ["utf-8", "utf-8-sig", "gbk", "gb2312"]
+    cache_key = (
+        os.path.abspath(path),
+        os.path.getmtime(path),
+        repr(dtype),
+        repr(sorted(kwargs.items())),
+    )
+    cached = _READ_CSV_CACHE.get(cache_key)
+    if cached is not None:
+        return cached.copy()
+
+    # 先探测编码，再整文件解析一次；仅当样本误判时按序重试其余编码
+    detected = detect_encoding(path)
+    encodings = [detected] + [e for e in _CSV_ENCODINGS if e != detected]
     last_err = None
     for enc in encodings:
         try:
-            df = pd.read_csv(path, encoding=enc, **kwargs)
+            df = None
+            if PYARROW_AVAILABLE and not kwargs:
+                # pyarrow引擎多线程解析，明显快于默认C引擎；
+                # 不支持的编码/参数组合时静默回退
+                try:
+                    df = pd.read_csv(path, encoding=enc, engine="pyarrow", dtype=dtype)
+                except (ValueError, TypeError, ImportError):
+                    df = None
+            if df is None:
+                try:
+                    df = pd.read_csv(path, encoding=enc, dtype=dtype, **kwargs)
+                except (ValueError, TypeError):
+                    if dtype is None:
+                        raise
+                    df = pd.read_csv(path, encoding=enc, **kwargs)
             if df.empty:
                 raise ValueError(f"文件为空: {path}")
-            return df
+            _READ_CSV_CACHE[cache_key] = df
+            return df.copy()
+        except UnicodeDecodeError as e:
+            last_err = e
         except Exception as e:
             last_err = e
+            break
     raise last_err
 
 
-def parse_date_series(series):
-    """智能解析日期列"""
-    s = series.astype(str).str.strip()
+# 去重日期字符串的解析缓存：长进程内同一批日期只解析一次
+_DATE_PARSE_CACHE = {}
+
+
+# 常见日期格式的正则分类：命中后用显式format单次解析，跳过格式推断
+_DATE_FORMAT_PATTERNS = [
+    (re.compile(r"\d{8}"), "%Y%m%d"),
+    (re.compile(r"\d{4}-\d{2}-\d{2}"), "%Y-%m-%d"),
+    (re.compile(r"\d{4}/\d{1,2}/\d{1,2}"), "%Y/%m/%d"),
+]
+
+
+def _parse_date_strings(values):
+    """对去重后的日期字符串数组执行多格式解析"""
+    # 用首个样本分类格式，整列按显式format一次解析
+    sample = next((v for v in values if v and v != "nan"), None)
+    if sample is not None:
+        for pattern, fmt in _DATE_FORMAT_PATTERNS:
+            if pattern.fullmatch(sample):
+                parsed = pd.to_datetime(values, format=fmt, errors="coerce")
+                # 样本误判（列内混杂格式）时回退到逐级尝试
+                if not parsed.isna().all():
+                    return parsed
+                break
+
     try:
-        return pd.to_datetime(s, errors="raise")
+        return pd.to_datetime(values, errors="raise")
     except Exception:
         pass
     try:
-        return pd.to_datetime(s, format="%Y%m%d", errors="raise")
+        return pd.to_datetime(values, format="%Y%m%d", errors="raise")
     except Exception:
         pass
-    return pd.to_datetime(s, errors="coerce")
+    return pd.to_datetime(values, errors="coerce")
+
+
+def parse_date_series(series):
+    """智能解析日期列"""
+    # 整数YYYYMMDD快速路径：纯算术构造日期，跳过字符串化
+    if pd.api.types.is_integer_dtype(series):
+        parsed = pd.to_datetime(
+            pd.DataFrame(
+                {
+                    "year": series // 10000,
+                    "month": (series // 100) % 100,
+                    "day": series % 100,
+                }
+            ),
+            errors="coerce",
+        )
+        # 整列坐标失真（如纯年份、时间戳整数）时回退到字符串管线
+        if len(parsed) == 0 or not parsed.isna().all():
+            return parsed
+    s = series.astype(str).str.strip()
+    # 只解析去重后的字符串，再按factorize编码映射回原序列
+    codes, uniques = pd.factorize(s)
+    cache_key = tuple(uniques)
+    parsed = _DATE_PARSE_CACHE.get(cache_key)
+    if parsed is None:
+        parsed = _parse_date_strings(uniques)
+        _DATE_PARSE_CACHE[cache_key] = parsed
+    # 缺失单元格的编码为-1，须补NaT而非按负索引回绕取值
+    return pd.Series(
+        parsed.take(codes, allow_fill=True, fill_value=pd.NaT), index=series.index
+    )
 
 
 def to_numeric(df, cols):
-    """将指定列转换为数值型"""
-    for c in cols:
-        if c in df.columns:
-            df[c] = pd.to_numeric(df[c], errors="coerce")
+    """将指定列转换为数值型（单次批量赋值，已是数值dtype的列跳过）"""
+    cols_present = [
+        c
+        for c in cols
+        if c in df.columns and not pd.api.types.is_numeric_dtype(df[c])
+    ]
+    if cols_present:
+        df[cols_present] = df[cols_present].apply(pd.to_numeric, errors="coerce")
     return df
 
 
+def log1p_array(values):
+    """log1p变换：numexpr可用时走多线程融合内核"""
+    x = np.asarray(values, dtype=np.float64)  # noqa: F841 numexpr按名取用
+    if NUMEXPR_AVAILABLE:
+        return ne.evaluate("log1p(x)")
+    return np.log1p(x)
+
+
 # ========== 数据加载模块 ==========
 def load_hs300(path):
     """加载沪深300数据"""
     log_message(f"加载沪深300数据: {path}")
-    df = try_read_csv(path)
+    df = try_read_csv(
+        path,
+        dtype={
+            "收盘": "float64",
+            "成交额": "float64",
+            "振幅": "float64",
+            "涨跌幅": "float64",
+            "换手率": "float64",
+            "换手": "float64",
+        },
+    )
     if "日期" not in df.columns:
         raise ValueError("沪深300数据缺少'日期'列")
 
@@ -244,7 +448,7 @@ def load_hs300(path):
 
     df["hs300_ret"] = df["hs300_close"].pct_change()
     df["hs300_turnover_log"] = (
-        np.log1p(df["hs300_turnover_amt"])
+        log1p_array(df["hs300_turnover_amt"])
         if "hs300_turnover_amt" in df.columns
         else np.nan
     )
@@ -272,7 +476,10 @@ def load_hs300(path):
 def load_csiall(path):
     """加载中证全指数据"""
     log_message(f"加载中证全指数据: {path}")
-    df = try_read_csv(path)
+    df = try_read_csv(
+        path,
+        dtype={"收盘": "float64", "成交额": "float64", "振幅": "float64", "涨跌幅": "float64"},
+    )
     if "日期" not in df.columns:
         raise ValueError("中证全指数据缺少'日期'列")
 
@@ -292,7 +499,7 @@ def load_csiall(path):
 
     df["csi_ret"] = df["csi_close"].pct_change()
     df["csi_turnover_log"] = (
-        np.log1p(df["csi_turnover_amt"]) if "csi_turnover_amt" in df.columns else np.nan
+        log1p_array(df["csi_turnover_amt"]) if "csi_turnover_amt" in df.columns else np.nan
     )
 
     log_message(f"中证全指数据加载完成，共{len(df)}条记录")
@@ -302,7 +509,10 @@ def load_csiall(path):
 def load_shanghai(path):
     """加载上证指数数据"""
     log_message(f"加载上证指数数据: {path}")
-    df = try_read_csv(path)
+    df = try_read_csv(
+        path,
+        dtype={"收盘": "float64", "成交额": "float64", "振幅": "float64", "涨跌幅": "float64"},
+    )
     if "日期" not in df.columns:
         raise ValueError("上证指数数据缺少'日期'列")
 
@@ -329,7 +539,7 @@ def load_shanghai(path):
 def load_margin(path):
     """加载融资融券数据"""
     log_message(f"加载融资融券数据: {path}")
-    df = try_read_csv(path)
+    df = try_read_csv(path, dtype={"融资余额": "float64", "融券余额": "float64"})
     if "日期" not in df.columns:
         raise ValueError("融资融券数据缺少'日期'列")
 
@@ -339,7 +549,7 @@ def load_margin(path):
 
     df["margin_total"] = df.get("融资余额", np.nan) + df.get("融券余额", np.nan)
     df["margin_total_log"] = (
-        np.log1p(df["margin_total"]) if "margin_total" in df.columns else np.nan
+        log1p_array(df["margin_total"]) if "margin_total" in df.columns else np.nan
     )
 
     log_message(f"融资融券数据加载完成，共{len(df)}条记录")
@@ -371,7 +581,7 @@ def load_douyin(path):
     df = df.sort_values("日期").reset_index(drop=True)
     df.rename(columns={search_col: "douyin_search"}, inplace=True)
     df["douyin_search_log"] = (
-        np.log1p(df["douyin_search"]) if "douyin_search" in df.columns else np.nan
+        log1p_array(df["douyin_search"]) if "douyin_search" in df.columns else np.nan
     )
 
     log_message(f"抖音搜索数据加载完成，共{len(df)}条记录")
@@ -381,7 +591,7 @@ def load_douyin(path):
 def load_pe_data(path):
     """加载沪深300历史市盈率数据"""
     log_message(f"加载市盈率数据: {path}")
-    df = try_read_csv(path)
+    df = try_read_csv(path, dtype={"滚动市盈率": "float64"})
     if "日期" not in df.columns:
         raise ValueError("市盈率数据缺少'日期'列")
     if "滚动市盈率" not in df.columns:
@@ -395,25 +605,180 @@ def load_pe_data(path):
     return df[["日期", "hs300_pe_ttm"]]
 
 
+def load_with_cache(name, path, loader):
+    """带Parquet缓存的加载：源CSV未变时直接读缓存，跳过解析和特征预处理"""
+    if not PYARROW_AVAILABLE:
+        return loader(path)
+
+    cache_path = os.path.join(os.path.dirname(path) or ".", f"_cache_{name}.parquet")
+    try:
+        if check_file_exists(cache_path) and os.path.getmtime(
+            cache_path
+        ) >= os.path.getmtime(path):
+            return pd.read_parquet(cache_path)
+    except Exception as e:
+        log_message(f"读取{name}缓存失败，回退到CSV: {e}", "WARNING")
+
+    df = loader(path)
+    try:
+        df.to_parquet(cache_path, engine="pyarrow", compression="zstd")
+    except Exception as e:
+        log_message(f"写入{name}缓存失败: {e}", "WARNING")
+    return df
+
+
 # ========== 特征工程模块 ==========
-def robust_rolling_z(series, window=60, trend_window=None, min_periods=None):
-    """稳健 rolling Z分数计算"""
+if NUMBA_AVAILABLE:
+
+    @njit(cache=True)
+    def _rolling_median_numba(x, window, min_periods):
+        """滑动中位数JIT内核：维护有序环形窗口，NaN感知，等价pandas语义"""
+        n = x.shape[0]
+        out = np.full(n, np.nan)
+        buf = np.empty(window, dtype=np.float64)  # 窗口内非NaN值的有序缓冲
+        count = 0
+        for i in range(n):
+            if i >= window:
+                old = x[i - window]
+                if not np.isnan(old):
+                    lo, hi = 0, count
+                    while lo < hi:
+                        mid = (lo + hi) // 2
+                        if buf[mid] < old:
+                            lo = mid + 1
+                        else:
+                            hi = mid
+                    for j in range(lo, count - 1):
+                        buf[j] = buf[j + 1]
+                    count -= 1
+            v = x[i]
+            if not np.isnan(v):
+                lo, hi = 0, count
+                while lo < hi:
+                    mid = (lo + hi) // 2
+                    if buf[mid] < v:
+                        lo = mid + 1
+                    else:
+                        hi = mid
+                for j in range(count, lo, -1):
+                    buf[j] = buf[j - 1]
+                buf[lo] = v
+                count += 1
+            if count >= min_periods and count > 0:
+                if count % 2 == 1:
+                    out[i] = buf[count // 2]
+                else:
+                    out[i] = 0.5 * (buf[count // 2 - 1] + buf[count // 2])
+        return out
+
+
+if NUMBA_AVAILABLE:
+
+    @njit(cache=True, parallel=True)
+    def _rolling_median_batch(X, windows, min_periods):
+        """按列并行的批量滑动中位数：各因子列独立，分摊到多核"""
+        n, k = X.shape
+        out = np.empty((n, k))
+        for j in prange(k):
+            out[:, j] = _rolling_median_numba(X[:, j].copy(), windows[j], min_periods[j])
+        return out
+
+
+# 滚动中位数结果缓存：相同(序列, 窗口)组合只计算一次。
+# 中位数是输入的纯函数，多个因子共享同一底层序列时命中
+_ROLLING_MEDIAN_CACHE = {}
+_ROLLING_MEDIAN_CACHE_MAX = 32
+
+
+def rolling_median(series, window, min_periods):
+    """滚动中位数：优先bottleneck的C实现，其次numba JIT内核，最后回退pandas"""
+    x = series.to_numpy(dtype=np.float64)
+    cache_key = (x.tobytes(), window, min_periods)
+    values = _ROLLING_MEDIAN_CACHE.get(cache_key)
+    if values is None:
+        # bottleneck要求window不超过序列长度，短序列走numba/pandas
+        if BOTTLENECK_AVAILABLE and window <= len(x):
+            values = bn.move_median(x, window=window, min_count=min_periods)
+        elif NUMBA_AVAILABLE:
+            values = _rolling_median_numba(x, window, min_periods)
+        else:
+            values = (
+                pd.Series(x).rolling(window, min_periods=min_periods).median().to_numpy()
+            )
+        if len(_ROLLING_MEDIAN_CACHE) >= _ROLLING_MEDIAN_CACHE_MAX:
+            _ROLLING_MEDIAN_CACHE.clear()
+        _ROLLING_MEDIAN_CACHE[cache_key] = values
+    return pd.Series(values, index=series.index)
+
+
+def rolling_mean(values, window, min_periods):
+    """滚动均值：优先使用bottleneck的C实现，失败则回退到pandas"""
+    x = np.asarray(values, dtype=np.float64)
+    # bottleneck要求window不超过序列长度，短序列回退pandas
+    if BOTTLENECK_AVAILABLE and window <= len(x):
+        return bn.move_mean(x, window=window, min_count=min_periods)
+    return pd.Series(x).rolling(window, min_periods=min_periods).mean().to_numpy()
+
+
+def robust_rolling_z(series, window=60, trend_window=None, min_periods=None, trend=None):
+    """稳健 rolling Z分数计算
+
+    trend可传入预先算好的趋势中位数序列，多个因子共享同一底层序列时
+    避免重复的长窗口rolling median。
+    """
     if min_periods is None:
         min_periods = max(3, window // 2)
-    s = series.copy()
-    if trend_window:
-        trend = s.rolling(trend_window, min_periods=1).median()
-        resid = s - trend
-    else:
-        resid = s
-    med = resid.rolling(window, min_periods=min_periods).median()
-    mad = (resid - med).abs().rolling(window, min_periods=min_periods).median()
-    std_est = mad * 1.4826
-    z = (resid - med) / std_est
+    # series仅被读取，无需防御性拷贝
+    if trend is None and trend_window:
+        trend = rolling_median(series, trend_window, 1)
+    resid = series - trend if trend is not None else series
+    med = rolling_median(resid, window, min_periods)
+    diff = resid - med  # 只做一次全量减法，MAD与Z共用
+    mad = rolling_median(diff.abs(), window, min_periods)
+    z = diff / (mad * 1.4826)
     z = z.replace([np.inf, -np.inf], np.nan)
     return z
 
 
+def robust_rolling_z_batch(specs):
+    """批量稳健Z分数：specs为[(序列, window, trend_window), ...]
+
+    numba可用时，把全部因子列的趋势去除、滚动中位数、MAD合并为三次
+    并行内核调用；否则逐列回退到robust_rolling_z。
+    """
+    if not NUMBA_AVAILABLE:
+        return [
+            robust_rolling_z(pd.Series(np.asarray(s, dtype=np.float64)), window=w, trend_window=tw)
+            for s, w, tw in specs
+        ]
+
+    k = len(specs)
+    n = len(specs[0][0])
+    X = np.empty((n, k), dtype=np.float64)
+    windows = np.empty(k, dtype=np.int64)
+    mps = np.empty(k, dtype=np.int64)
+    for j, (s, w, _) in enumerate(specs):
+        X[:, j] = np.asarray(s, dtype=np.float64)
+        windows[j] = w
+        mps[j] = max(3, w // 2)
+
+    # 趋势去除：只对声明了trend_window的列批量跑长窗口中位数
+    trend_cols = [j for j, (_, _, tw) in enumerate(specs) if tw]
+    if trend_cols:
+        idx = np.array(trend_cols)
+        tw_arr = np.array([specs[j][2] for j in trend_cols], dtype=np.int64)
+        trends = _rolling_median_batch(
+            np.ascontiguousarray(X[:, idx]), tw_arr, np.ones(len(idx), dtype=np.int64)
+        )
+        X[:, idx] -= trends
+
+    med = _rolling_median_batch(X, windows, mps)
+    mad = _rolling_median_batch(np.abs(X - med), windows, mps)
+    Z = (X - med) / (mad * 1.4826)
+    Z[~np.isfinite(Z)] = np.nan
+    return [Z[:, j] for j in range(k)]
+
+
 def clip_series(s, low=-3.0, high=3.0):
     """截断Z分数"""
     return s.clip(lower=low, upper=high)
@@ -421,85 +786,107 @@ def clip_series(s, low=-3.0, high=3.0):
 
 def logistic_to_0_100(x, k=1.2, x0=0.0):
     """将Z分数映射到0-100区间"""
+    if SCIPY_AVAILABLE:
+        # expit内部处理溢出，无需clip，单次内核完成sigmoid
+        return 100.0 * expit(k * (np.asarray(x) - x0))
+    if NUMEXPR_AVAILABLE:
+        # numexpr单次融合求值，不产生中间临时数组（exp溢出到inf时结果安全归0）
+        x = np.asarray(x, dtype=np.float64)  # noqa: F841 numexpr按名取用
+        return ne.evaluate("100.0 / (1.0 + exp(-(x - x0) * k))")
     z = np.clip((x - x0) * k, -50, 50)
     return 100.0 / (1.0 + np.exp(-z))
 
 
+def pair_mean(a, b):
+    """两列逐行skipna均值：无分支np.where链，避开DataFrame归约协议"""
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    return np.where(np.isnan(a), b, np.where(np.isnan(b), a, 0.5 * (a + b)))
+
+
 def build_features(merged):
     """基于优化方案，生成各维度特征"""
     log_message("开始特征工程...")
     out = merged.copy().sort_values("日期").reset_index(drop=True)
     long_trend = 252  # 一年滚动中位数去趋势
 
+    # 先准备各因子的源序列，再批量计算全部Z分数列
     # 1. 交易与流动性维度 (window=60)
-    out["turnover_log_all"] = out[["hs300_turnover_log", "csi_turnover_log"]].mean(
-        axis=1, skipna=True
-    )
-    out["turnover_heat_z"] = robust_rolling_z(
-        out["turnover_log_all"], window=60, trend_window=long_trend
-    )
-    out["turnover_heat_z"] = clip_series(out["turnover_heat_z"])
-
-    out["turnover_rate_heat_z"] = robust_rolling_z(
-        out["hs300_turnover_rate"], window=60, trend_window=long_trend
-    )
-    out["turnover_rate_heat_z"] = clip_series(out["turnover_rate_heat_z"])
-
-    out["amplitude_mean"] = out[["hs300_amplitude", "csi_amplitude"]].mean(
-        axis=1, skipna=True
-    )
-    out["amplitude_heat_z"] = robust_rolling_z(
-        out["amplitude_mean"], window=60, trend_window=None
-    )
-    out["amplitude_heat_z"] = clip_series(out["amplitude_heat_z"])
-
-    # 2. 情绪与舆情维度 (window=60或120)
-    out["search_heat_z"] = robust_rolling_z(
-        out["douyin_search_log"], window=60, trend_window=long_trend
-    )
-    out["search_heat_z"] = clip_series(out["search_heat_z"])
-
-    out["margin_heat_z"] = robust_rolling_z(
-        out["margin_total_log"], window=120, trend_window=long_trend
-    )
-    out["margin_heat_z"] = clip_series(out["margin_heat_z"])
+    turnover_log_all = pair_mean(out["hs300_turnover_log"], out["csi_turnover_log"])
+    amplitude_mean = pair_mean(out["hs300_amplitude"], out["csi_amplitude"])
 
     # 3. 价格趋势与动能维度 (window=60)
-    out["ret_mean"] = out[["hs300_ret", "csi_ret"]].mean(axis=1, skipna=True)
-    out["ret_10d"] = (
-        out["ret_mean"]
-        .rolling(10, min_periods=1)
-        .apply(lambda x: (np.prod(1 + x) - 1) if len(x) > 0 else np.nan, raw=False)
-    )
-    out["price_accel_z"] = robust_rolling_z(
-        out["ret_10d"], window=60, trend_window=None
-    )
-    out["price_accel_z"] = clip_series(out["price_accel_z"])
-
-    out["hs300_ma200"] = out["hs300_close"].rolling(200, min_periods=1).mean()
+    ret_mean = pair_mean(out["hs300_ret"], out["csi_ret"])
+    # prod(1+x)-1 == expm1(sum(log1p(x)))，滚动和用前缀和差分一次算完，
+    # 有效样本计数保持min_periods=1语义（全NaN窗口仍为NaN）
+    lg = np.log1p(ret_mean)
+    lg_valid = ~np.isnan(lg)
+    cum_sum = np.concatenate([[0.0], np.cumsum(np.where(lg_valid, lg, 0.0))])
+    cum_cnt = np.concatenate([[0], np.cumsum(lg_valid.astype(np.int64))])
+    win_sum = np.concatenate([cum_sum[1:10], cum_sum[10:] - cum_sum[:-10]])
+    win_cnt = np.concatenate([cum_cnt[1:10], cum_cnt[10:] - cum_cnt[:-10]])
+    ret_10d = np.where(win_cnt > 0, np.expm1(win_sum), np.nan)
+
+    out["hs300_ma200"] = rolling_mean(out["hs300_close"].to_numpy(), 200, 1)
     out["ma_spread"] = out["hs300_close"] / out["hs300_ma200"] - 1
-    out["ma_spread_z"] = robust_rolling_z(
-        out["ma_spread"], window=60, trend_window=None
-    )
-    out["ma_spread_z"] = clip_series(out["ma_spread_z"])
 
-    out["up_ratio"] = (out["hs300_ret"] > 0).rolling(20, min_periods=1).mean()
-    out["up_ratio_z"] = robust_rolling_z(out["up_ratio"], window=60, trend_window=None)
-    out["up_ratio_z"] = clip_series(out["up_ratio_z"])
+    # 上涨天数占比：固定20日窗口的布尔均值即前缀和差分，O(N)免滚动机制
+    pos = (out["hs300_ret"].to_numpy() > 0).astype(np.float64)
+    pos_cum = np.concatenate([[0.0], np.cumsum(pos)])
+    up_counts = np.concatenate([pos_cum[1:20], pos_cum[20:] - pos_cum[:-20]])
+    out["up_ratio"] = up_counts / np.minimum(np.arange(1, len(pos) + 1), 20)
+
+    # 各维度因子: (列名, 源序列, window, trend_window)
+    # 维度1 交易与流动性(60) / 维度2 情绪与舆情(60/120) /
+    # 维度3 价格趋势与动能(60) / 维度4 估值(120)
+    z_specs = [
+        ("turnover_heat_z", turnover_log_all, 60, long_trend),
+        ("turnover_rate_heat_z", out["hs300_turnover_rate"], 60, long_trend),
+        ("amplitude_heat_z", amplitude_mean, 60, None),
+        ("search_heat_z", out["douyin_search_log"], 60, long_trend),
+        ("margin_heat_z", out["margin_total_log"], 120, long_trend),
+        ("price_accel_z", ret_10d, 60, None),
+        ("ma_spread_z", out["ma_spread"], 60, None),
+        ("up_ratio_z", out["up_ratio"], 60, None),
+        ("pe_valuation_z", out["hs300_pe_ttm"], 120, long_trend),
+    ]
+    z_values = robust_rolling_z_batch([(s, w, tw) for _, s, w, tw in z_specs])
 
-    # 4. 估值维度 (window=120)
-    out["pe_valuation_z"] = robust_rolling_z(
-        out["hs300_pe_ttm"], window=120, trend_window=long_trend
-    )
-    out["pe_valuation_z"] = clip_series(out["pe_valuation_z"])
+    # 统一截断并单次写回，pandas只新建一个数据块
+    # Z分数最终只需2-3位小数精度，float32存储减半缓存占用
+    Z = np.column_stack(
+        [np.asarray(v, dtype=np.float64) for v in z_values]
+    ).astype(np.float32)
+    np.clip(Z, -3.0, 3.0, out=Z)
+    out[[name for name, _, _, _ in z_specs]] = Z
 
     log_message("特征工程完成")
     return out
 
 
 # ========== 指数计算模块 ==========
+if NUMBA_AVAILABLE:
+
+    @njit(cache=True)
+    def _ewm_span_numba(x, span):
+        alpha = 2.0 / (span + 1.0)
+        out = np.empty_like(x)
+        out[0] = x[0]
+        for i in range(1, len(x)):
+            out[i] = alpha * x[i] + (1.0 - alpha) * out[i - 1]
+        return out
+
+
+def ewm_mean(x, span):
+    """EWMA平滑（等价ewm(span, adjust=False).mean()），numba可用时走JIT递推"""
+    x = np.asarray(x, dtype=np.float64)
+    if NUMBA_AVAILABLE and len(x) > 0:
+        return _ewm_span_numba(x, span)
+    return pd.Series(x).ewm(span=span, adjust=False).mean().to_numpy()
+
+
 def combine_to_escape_index(df, logistic_k=1.2, logistic_x0=0.0, signal_threshold=75):
-    """计算逃顶指数"""
+    """计算逃顶指数（结果列就地写入df并返回，避免整表复制）"""
     log_message("开始计算逃顶指数...")
 
     # 按照维度重新分配权重，总和为10
@@ -520,45 +907,91 @@ def combine_to_escape_index(df, logistic_k=1.2, logistic_x0=0.0, signal_threshol
     }
 
     z_cols = [c for c in weights.keys()]
-    z_mat = df[z_cols]
-    available = ~z_mat.isna()
-    w = pd.Series(weights)
-    w_df = pd.DataFrame(
-        np.tile(w.values, (len(df), 1)), index=df.index, columns=w.index
+    # 向量化加权：用NumPy掩码点积代替逐行平铺权重矩阵
+    # float32足以支撑最终2-3位小数的输出精度，同时减半内存带宽
+    z_np = df[z_cols].to_numpy(dtype=np.float32)
+    mask = ~np.isnan(z_np)
+    w_vec = np.array([weights[c] for c in z_cols], dtype=np.float32)
+    w_sum = mask.astype(np.float32) @ w_vec
+    crowding_np = np.divide(
+        np.where(mask, z_np, np.float32(0.0)) @ w_vec,
+        w_sum,
+        out=np.zeros(len(df), dtype=np.float32),
+        where=w_sum > 0,
     )
-    w_df = w_df.where(available, np.nan)
-    w_sum = w_df.sum(axis=1)
-    w_df = w_df.div(w_sum.replace(0, np.nan), axis=0)
-
-    crowding_z = (z_mat * w_df).sum(axis=1)
-    score_raw = logistic_to_0_100(crowding_z, k=logistic_k, x0=logistic_x0)
+    crowding_z = pd.Series(crowding_np, index=df.index)
+    # logistic与EWMA直接在原始数组上串联，绕过Series装箱
+    score_raw = logistic_to_0_100(crowding_np, k=logistic_k, x0=logistic_x0)
 
     # 优化: 增大平滑窗口至10日，使曲线更平滑
-    score_smoothed = pd.Series(score_raw).ewm(span=10, adjust=False).mean().values
+    score_smoothed = ewm_mean(score_raw, span=10)
 
-    out = df.copy()
+    out = df
     out["crowding_z"] = crowding_z
     out["escape_index_raw"] = np.round(score_raw, 3)
     out["escape_index_0_100"] = np.round(score_smoothed, 2)
     out["escape_signal"] = (out["escape_index_0_100"] >= signal_threshold).astype(int)
 
-    def label(s):
-        if pd.isna(s):
-            return "NA"
-        if s >= 85:
-            return "极度警戒"
-        if s >= 75:
-            return "强警戒"
-        if s >= 60:
-            return "警惕"
-        return "相对安全"
-
-    out["escape_level"] = out["escape_index_0_100"].apply(label)
+    # 向量化分级：pd.cut一次digitize代替逐行Python函数
+    out["escape_level"] = (
+        pd.cut(
+            out["escape_index_0_100"],
+            bins=[-np.inf, 60, 75, 85, np.inf],
+            labels=["相对安全", "警惕", "强警戒", "极度警戒"],
+            right=False,
+        )
+        .astype(object)
+        .fillna("NA")
+    )
 
     log_message("逃顶指数计算完成")
     return out
 
 
+# ========== 输出模块 ==========
+def write_output_csv(outdf, path):
+    """输出CSV：优先pyarrow的C++写出器（补utf-8-sig BOM），失败回退pandas"""
+    if PYARROW_AVAILABLE:
+        try:
+            import pyarrow as pa
+            import pyarrow.csv as pacsv
+
+            table = pa.Table.from_pandas(outdf, preserve_index=False)
+            # 日期列按date32写出，保持与pandas to_csv一致的YYYY-MM-DD格式
+            if "日期" in table.column_names:
+                i = table.schema.get_field_index("日期")
+                if pa.types.is_timestamp(table.schema.field(i).type):
+                    table = table.set_column(
+                        i, "日期", table.column(i).cast(pa.date32())
+                    )
+            with open(path, "wb") as f:
+                f.write(b"\xef\xbb\xbf")  # 保持utf-8-sig兼容
+                # 表头自行写出：pyarrow会强制给表头加引号，而下游
+                # csv-parser + BOM的组合要求与pandas一致的无引号表头
+                f.write(",".join(outdf.columns).encode("utf-8") + b"\n")
+                pacsv.write_csv(
+                    table,
+                    f,
+                    write_options=pacsv.WriteOptions(
+                        include_header=False, quoting_style="none"
+                    ),
+                )
+            return
+        except Exception as e:
+            log_message(f"pyarrow写出失败，回退pandas: {e}", "WARNING")
+    outdf.to_csv(path, index=False, encoding="utf-8-sig")
+
+
+def write_output(outdf, path):
+    """按输出路径后缀选择格式：.parquet走列式写出，其余保持CSV"""
+    if str(path).endswith(".parquet"):
+        if not PYARROW_AVAILABLE:
+            raise ValueError("输出Parquet需要安装pyarrow")
+        outdf.to_parquet(path, engine="pyarrow", compression="zstd", index=False)
+        return
+    write_output_csv(outdf, path)
+
+
 # ========== 主函数 ==========
 def main():
     """主函数"""
@@ -567,7 +1000,9 @@ def main():
     parser.add_argument(
         "--skip-fetch", action="store_true", help="跳过数据获取，使用现有文件"
     )
-    parser.add_argument("--out", default=DEFAULT_OUTPUT, help="输出文件名")
+    parser.add_argument(
+        "--out", default=DEFAULT_OUTPUT, help="输出文件名（.parquet后缀时输出Parquet）"
+    )
     parser.add_argument("--signal", type=float, default=75.0, help="信号阈值")
     args = parser.parse_args()
 
@@ -585,36 +1020,58 @@ def main():
     # 步骤2: 数据加载和合并
     log_message("步骤2: 数据加载和合并")
     try:
-        # 加载核心数据
-        hs300 = load_hs300(DEFAULT_FILES["hs300"])
-        csiall = load_csiall(DEFAULT_FILES["csiall"])
-        merged = pd.merge(hs300, csiall, on="日期", how="outer")
-
-        # 加载上证指数数据
-        try:
-            shanghai = load_shanghai(DEFAULT_FILES["shanghai"])
-            merged = pd.merge(merged, shanghai, on="日期", how="left")
-        except Exception as e:
-            log_message(f"上证指数数据加载失败: {e}", "WARNING")
-
-        # 加载可选数据
-        optional_data = [
+        # 并发加载全部数据源：磁盘I/O与解析相互重叠
+        loader_specs = [
+            ("hs300", load_hs300),
+            ("csiall", load_csiall),
+            ("shanghai", load_shanghai),
             ("margin", load_margin),
             ("douyin", load_douyin),
             ("pe", load_pe_data),
         ]
+        with ThreadPoolExecutor(max_workers=len(loader_specs)) as executor:
+            futures = {
+                name: executor.submit(
+                    load_with_cache, name, DEFAULT_FILES[name], loader
+                )
+                for name, loader in loader_specs
+            }
+
+        # 核心数据缺失时直接失败
+        hs300 = futures["hs300"].result().set_index("日期")
+        csiall = futures["csiall"].result().set_index("日期")
+        frames = [hs300, csiall]
+
+        # 上证指数数据加载失败仅告警
+        try:
+            frames.append(futures["shanghai"].result().set_index("日期"))
+        except Exception as e:
+            log_message(f"上证指数数据加载失败: {e}", "WARNING")
 
-        for data_key, loader_func in optional_data:
+        # 可选数据加载失败仅告警
+        for data_key in ("margin", "douyin", "pe"):
             try:
-                data = loader_func(DEFAULT_FILES[data_key])
-                merged = pd.merge(merged, data, on="日期", how="left")
+                frames.append(futures[data_key].result().set_index("日期"))
                 log_message(f"{data_key}数据合并成功")
             except Exception as e:
                 log_message(f"{data_key}数据加载失败: {e}", "WARNING")
 
-        # 前向填充缺失值
-        merged = merged.sort_values("日期").set_index("日期")
-        merged = merged.ffill()
+        # 统一日期索引对齐合并，代替逐个hash merge：
+        # 行集合仍由两大核心指数的日期并集决定（等价原outer+left merge）
+        idx = hs300.index.union(csiall.index).sort_values()
+        merged = pd.concat([f.reindex(idx) for f in frames], axis=1)
+
+        # 前向填充缺失值：全float块时用bottleneck.push单遍完成
+        if BOTTLENECK_AVAILABLE and all(
+            pd.api.types.is_float_dtype(t) for t in merged.dtypes
+        ):
+            merged = pd.DataFrame(
+                bn.push(merged.to_numpy(dtype=np.float64), axis=0),
+                index=merged.index,
+                columns=merged.columns,
+            )
+        else:
+            merged = merged.ffill()
         merged = merged.reset_index()
 
         log_message(f"数据合并完成，共{len(merged)}条记录")
@@ -683,7 +1140,7 @@ def main():
         available_cols = [c for c in output_cols if c in result.columns]
         outdf = result[available_cols].sort_values("日期")
 
-        outdf.to_csv(args.out, index=False, encoding="utf-8-sig")
+        write_output(outdf, args.out)
         log_message(f"逃顶指数已输出到: {args.out}")
 
         # 输出统计信息